@@ -4,7 +4,7 @@
 # generated using Matplotlib and served as images.
 
 # --- Library Imports ---
-from flask import Flask, render_template_string, request, session
+from flask import Flask, Response, abort, render_template_string, request, session, stream_with_context, url_for
 import requests
 import sys
 import matplotlib
@@ -13,16 +13,39 @@ import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import seaborn as sns
+from PIL import Image  # Pillow is installed with Matplotlib; used for palette PNG and WebP
 import io
-import base64
-from datetime import datetime, timedelta
+import gzip
+from datetime import datetime, timedelta, timezone
 import os  # We'll use this to get a secure random key
+import re
+import time
+import threading
+import weather_history  # On-disk history of every collected sample, used for exports
+import shared_state  # Files shared by all worker processes on this host
 
 # --- Flask App Initialization ---
 app = Flask(__name__)
+
+
+def load_secret_key():
+    """
+    Returns the secret key shared by all worker processes, creating it once.
+
+    Every worker must sign sessions with the same key, otherwise a session
+    created by one worker is rejected by the others.
+    """
+    with shared_state.locked("secret_key"):
+        secret_key = shared_state.read_bytes("secret_key")
+        if not secret_key:
+            secret_key = os.urandom(24)
+            shared_state.write_bytes("secret_key", secret_key)
+    return secret_key
+
+
 # Set a secret key for the application to enable sessions.
 # A session is needed to remember the last searched city across page refreshes.
-app.secret_key = os.urandom(24)
+app.secret_key = load_secret_key()
 
 # --- API Configuration ---
 # IMPORTANT: This API key is used to fetch current weather data from OpenWeatherMap.
@@ -32,13 +55,63 @@ API_KEY = "018ecddd8ef7f830fb239f1edd238b9e"
 CURRENT_WEATHER_URL = "http://api.openweathermap.org/data/2.5/weather"
 # Base URL for 5-day forecast data.
 FORECAST_URL = "http://api.openweathermap.org/data/2.5/forecast"
-
-# Global data storage for the live graphs.
-timestamps = []
-temperatures = []
-humidity = []
-wind_speed = []
-pressure = []
+# Seconds to wait for the API. API calls are made while holding a lock that
+# other workers wait on, so a hung call must not block them forever.
+REQUEST_TIMEOUT = 10
+# The city shown when none has been searched for yet.
+DEFAULT_CITY = "Dnipro, Ukraine"
+
+# --- Shared State Configuration ---
+# The series, API payloads and chart images live in shared files (see
+# shared_state.py and weather_history.py) instead of per-process lists, so
+# every worker process serves the same data.
+# How often (in seconds) the collector fetches new data; matches the page refresh.
+POLL_INTERVAL = 15
+# How long (in seconds) a cached forecast is reused before it is fetched again.
+FORECAST_MAX_AGE = 600
+# Cities not viewed for this many seconds are no longer collected.
+ACTIVE_CITY_TIMEOUT = 600
+# Number of data points shown on the live graphs.
+LIVE_POINTS = 60
+
+# --- Chart Image Configuration ---
+# Chart image formats and their media types.
+IMAGE_FORMATS = {
+    "svg": "image/svg+xml",
+    "webp": "image/webp",
+    "png8": "image/png",  # PNG with a palette of PALETTE_COLORS colors
+    "png": "image/png",   # Full-color PNG
+}
+# The order in which formats are tried, smallest first (see benchmark_plot.py).
+# Gzipped SVG stays about 20 KB at any size, while raster images grow with
+# their pixel count, so large or high-resolution charts prefer SVG. Without
+# gzip, SVG is larger than every raster format.
+RASTER_FORMAT_PREFERENCE = ("webp", "png8", "svg", "png")
+LARGE_FORMAT_PREFERENCE = ("svg", "webp", "png8", "png")
+UNCOMPRESSED_FORMAT_PREFERENCE = ("webp", "png8", "png", "svg")
+# Charts with at least this many image pixels use LARGE_FORMAT_PREFERENCE.
+SVG_MIN_PIXELS = 640_000
+# Number of colors kept in a palette PNG.
+PALETTE_COLORS = 64
+# Compression effort, from 0 (fastest) to 9 (smallest). Set here rather than
+# by the client so each chart is only encoded once.
+DEFAULT_COMPRESS_LEVEL = 6
+# Charts narrower than this (in CSS pixels) are drawn at this width and scaled down.
+MIN_LAYOUT_WIDTH = 640
+# Chart widths (in CSS pixels) and device pixel ratios that are rendered. Requests
+# are rounded up to the next one, so at most a few dozen images exist per city.
+PLOT_WIDTHS = (480, 640, 800, 960, 1280, 1600)
+DEVICE_PIXEL_RATIOS = (1, 2, 3)
+
+# Only one thread per process may draw with Matplotlib's pyplot at a time.
+_render_lock = threading.Lock()
+
+# Process id of the worker that started its collector thread (see start_collector).
+_collector_pid = None
+# Makes sure only one request thread starts the collector thread.
+_collector_start_lock = threading.Lock()
+# When this process last marked each city as active, to avoid a write per request.
+_city_touched_at = {}
 
 
 # --- Function Definitions ---
@@ -64,9 +137,15 @@ def get_weather_data(api_url, city_name):
     }
 
     try:
-        response = requests.get(api_url, params=params)
+        response = requests.get(api_url, params=params, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
         return response.json()
+    except requests.exceptions.HTTPError as e:
+        if e.response is not None and e.response.status_code == 404:
+            # The API does not know this city, so stop asking for it.
+            reject_city(city_name)
+        print(f"ERROR: Failed to retrieve weather data from {api_url}. {e}", file=sys.stderr)
+        return None
     except requests.exceptions.RequestException as e:
         print(f"ERROR: Failed to retrieve weather data from {api_url}. {e}", file=sys.stderr)
         return None
@@ -82,7 +161,13 @@ def get_weather_forecast(city_name):
     Returns:
         list: A list of dictionaries, each containing forecast data for a day.
     """
-    forecast_data = get_weather_data(FORECAST_URL, city_name)
+    if is_rejected_city(city_name):
+        return []
+
+    forecast_data = shared_state.cached_json(
+        f"forecast-{weather_history.city_slug(city_name)}.json", FORECAST_MAX_AGE,
+        lambda: get_weather_data(FORECAST_URL, city_name)
+    )
     if not forecast_data:
         return []
 
@@ -179,88 +264,410 @@ def get_weather_icon(weather_main):
 
 def update_live_data(city_name):
     """
-    Fetches new data and appends it to the global lists for live visualization.
+    Fetches new data and appends it to the city's shared history for live visualization.
+
+    Returns:
+        dict or None: The current weather data, or None on failure.
     """
     data = get_weather_data(CURRENT_WEATHER_URL, city_name)
+
     if data and 'main' in data and 'wind' in data:
-        current_temp = data['main']['temp']
-        current_humidity = data['main']['humidity']
-        current_wind_speed = data['wind']['speed']
-        current_pressure = data['main']['pressure']
-        current_time = datetime.now()
-
-        # Append new data points.
-        timestamps.append(current_time)
-        temperatures.append(current_temp)
-        humidity.append(current_humidity)
-        wind_speed.append(current_wind_speed)
-        pressure.append(current_pressure)
-
-        # Keep only the last 60 data points for better visibility.
-        if len(timestamps) > 60:
-            timestamps.pop(0)
-            temperatures.pop(0)
-            humidity.pop(0)
-            wind_speed.pop(0)
-            pressure.pop(0)
+        # Keep the full history on disk so every worker can plot and export it.
+        weather_history.record_sample(city_name, datetime.now(timezone.utc), data['main']['temp'],
+                                      data['main']['humidity'], data['wind']['speed'],
+                                      data['main']['pressure'])
+        return data
+
+    print("Failed to retrieve current weather data. Keeping existing data.", file=sys.stderr)
+    return None
+
+
+def get_current_weather(city_name, max_age=2 * POLL_INTERVAL):
+    """
+    Returns the current weather for a city from the shared cache.
+
+    The API is only called when the cached data is older than max_age, and then
+    by a single worker at a time, so adding workers does not add API calls.
+
+    Args:
+        city_name (str): The name of the city.
+        max_age (float): How old (in seconds) the cached data may be.
+
+    Returns:
+        dict or None: The current weather data, or None if it was never fetched.
+    """
+    if is_rejected_city(city_name):
+        return None
+    return shared_state.cached_json(
+        f"current-{weather_history.city_slug(city_name)}.json", max_age,
+        lambda: update_live_data(city_name)
+    )
+
+
+def reject_city(city_name):
+    """
+    Remembers that the API does not know a city and stops collecting it.
+
+    The city is not asked for again until ACTIVE_CITY_TIMEOUT has passed.
+    """
+    shared_state.write_json(f"rejected-{weather_history.city_slug(city_name)}.json", city_name)
+    shared_state.forget_city(city_name)
+
+
+def is_rejected_city(city_name):
+    """
+    Returns True if the API recently reported that it does not know a city.
+    """
+    return shared_state.read_json(f"rejected-{weather_history.city_slug(city_name)}.json",
+                                  ACTIVE_CITY_TIMEOUT) is not None
+
+
+def watch_city(city_name):
+    """
+    Marks a city as being viewed so the collector keeps collecting its data.
+    """
+    if is_rejected_city(city_name):
+        return
+    now = time.time()
+    if now - _city_touched_at.get(city_name, 0) >= POLL_INTERVAL:
+        shared_state.touch_city(city_name, ACTIVE_CITY_TIMEOUT)
+        _city_touched_at[city_name] = now
+
+
+def is_needed_state_file(name, active_slugs):
+    """
+    Decides whether a shared state file is still needed.
+
+    Cached data and chart images are only needed for cities being watched,
+    and a rejected-city marker only until it has expired.
+
+    Args:
+        name (str): The file name, e.g. 'current-dnipro_ukraine.json'.
+        active_slugs (set): The slugs of the cities being watched.
+
+    Returns:
+        bool: True if the file must be kept.
+    """
+    if name.startswith("."):
+        return False  # Temporary file left behind by an interrupted write.
+    kind, _, rest = name.partition("-")
+    if kind == "rejected":
+        return False
+    if kind in ("current", "forecast", "plot"):
+        return re.split(r"[-.]", rest)[0] in active_slugs
+    return True
+
+
+def remove_unused_state():
+    """
+    Deletes shared files for cities that are no longer watched or rejected.
+    """
+    active_slugs = {weather_history.city_slug(city) for city in shared_state.active_cities(ACTIVE_CITY_TIMEOUT)}
+    shared_state.remove_unused(ACTIVE_CITY_TIMEOUT, lambda name: is_needed_state_file(name, active_slugs))
+
+
+def run_collector():
+    """
+    Background loop run by every worker. Only the worker elected as collector
+    fetches data; the others keep trying in case the collector goes away.
+    """
+    while True:
+        try:
+            if shared_state.try_become_collector():
+                for city_name in shared_state.active_cities(ACTIVE_CITY_TIMEOUT):
+                    # Refresh anything older than half an interval so that each
+                    # tick of this loop collects one new sample per city.
+                    get_current_weather(city_name, max_age=POLL_INTERVAL / 2)
+                remove_unused_state()
+        except Exception as e:
+            # Never let one failure stop data collection for good.
+            print(f"ERROR: Collector failed. {e}", file=sys.stderr)
+        time.sleep(POLL_INTERVAL)
+
+
+@app.before_request
+def start_collector():
+    """
+    Starts the collector thread once in each worker process.
+
+    This runs on the first request rather than at import time, because worker
+    processes forked from a preloaded app do not inherit the parent's threads.
+    """
+    global _collector_pid
+    # Threaded workers may run several first requests at once.
+    with _collector_start_lock:
+        if _collector_pid != os.getpid():
+            _collector_pid = os.getpid()
+            threading.Thread(target=run_collector, name="weather-collector", daemon=True).start()
+
+
+def parse_accept(accept_header):
+    """
+    Reads an HTTP Accept header into a dictionary of media types and their quality.
+
+    Args:
+        accept_header (str): e.g. 'image/webp,image/*;q=0.8'.
+
+    Returns:
+        dict: Media type -> quality (0 to 1), e.g. {'image/webp': 1.0, 'image/*': 0.8}.
+    """
+    accepted = {}
+    # A request without an Accept header accepts any type.
+    for part in (accept_header or "*/*").split(","):
+        media_type, *params = [item.strip() for item in part.split(";")]
+        if not media_type:
+            continue
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        accepted[media_type.lower()] = quality
+    return accepted
+
+
+def choose_image_format(accept_header, gzip_accepted=True, pixels=0):
+    """
+    Picks the smallest chart image format the browser accepts.
+
+    Args:
+        accept_header (str): The HTTP Accept header sent with the image request.
+        gzip_accepted (bool): Whether the browser accepts gzip-compressed responses.
+        pixels (int): The number of pixels in a raster image of the chart.
+
+    Returns:
+        str: One of the keys of IMAGE_FORMATS.
+    """
+    if not gzip_accepted:
+        preference = UNCOMPRESSED_FORMAT_PREFERENCE
+    elif pixels >= SVG_MIN_PIXELS:
+        preference = LARGE_FORMAT_PREFERENCE
     else:
-        print("Failed to retrieve current weather data. Keeping existing data.", file=sys.stderr)
-
-
-def create_plot(city_name):
-    """
-    Creates the weather dashboard plot and returns it as a base64-encoded string.
-    """
-    # Use a modern, light seaborn style that fits the glassmorphism theme
-    sns.set_style("whitegrid")
-
-    # Create a figure with four subplots.
-    fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=(16, 12))
-    fig.suptitle(f"Live Weather Data for {city_name}", fontsize=24, weight='bold', y=0.95, color='#4a5568')
-
-    # --- Plot 1: Temperature ---
-    ax1.plot(timestamps, temperatures, color='#f56565', marker='o', linestyle='-', linewidth=2, markersize=6)
-    ax1.set_title("Temperature (°C)", fontsize=16, weight='bold', color='#4a5568')
-    ax1.set_ylabel("Temp (°C)", fontsize=14, color='#718096')
-    ax1.grid(True, linestyle='--', alpha=0.6)
-    ax1.tick_params(colors='#718096')
-
-    # --- Plot 2: Humidity ---
-    ax2.plot(timestamps, humidity, color='#48bb78', marker='o', linestyle='-', linewidth=2, markersize=6)
-    ax2.set_title("Humidity (%)", fontsize=16, weight='bold', color='#4a5568')
-    ax2.set_ylabel("Humidity (%)", fontsize=14, color='#718096')
-    ax2.grid(True, linestyle='--', alpha=0.6)
-    ax2.tick_params(colors='#718096')
-
-    # --- Plot 3: Wind Speed ---
-    ax3.plot(timestamps, wind_speed, color='#667eea', marker='o', linestyle='-', linewidth=2, markersize=6)
-    ax3.set_title("Wind Speed (m/s)", fontsize=16, weight='bold', color='#4a5568')
-    ax3.set_ylabel("Wind Speed (m/s)", fontsize=14, color='#718096')
-    ax3.set_xlabel("Time", fontsize=14, color='#718096')
-    ax3.grid(True, linestyle='--', alpha=0.6)
-    ax3.tick_params(colors='#718096')
-    plt.setp(ax3.get_xticklabels(), rotation=45, ha='right')
-
-    # --- Plot 4: Atmospheric Pressure ---
-    ax4.plot(timestamps, pressure, color='#f6ad55', marker='o', linestyle='-', linewidth=2, markersize=6)
-    ax4.set_title("Atmospheric Pressure (hPa)", fontsize=16, weight='bold', color='#4a5568')
-    ax4.set_ylabel("Pressure (hPa)", fontsize=14, color='#718096')
-    ax4.set_xlabel("Time", fontsize=14, color='#718096')
-    ax4.grid(True, linestyle='--', alpha=0.6)
-    ax4.tick_params(colors='#718096')
-    plt.setp(ax4.get_xticklabels(), rotation=45, ha='right')
-
-    # General figure and layout adjustments
-    fig.tight_layout(rect=[0, 0.03, 1, 0.95])
-
-    # Save the plot to a BytesIO object.
-    img_stream = io.BytesIO()
-    plt.savefig(img_stream, format='png', transparent=True)
-    plt.close(fig)  # Close the figure to free up memory.
-    img_stream.seek(0)
+        preference = RASTER_FORMAT_PREFERENCE
+
+    accepted = parse_accept(accept_header)
+    for image_format in preference:
+        media_type = IMAGE_FORMATS[image_format]
+        # An exact match wins over wildcards, so 'image/webp;q=0' rules WebP out.
+        quality = accepted.get(media_type, accepted.get("image/*", accepted.get("*/*", 0)))
+        if quality > 0:
+            return image_format
+    # Every browser can show a PNG, even if it does not say so.
+    return "png"
+
+
+def read_plot_options(args):
+    """
+    Reads the chart width, resolution and format from request arguments.
+
+    The width and resolution are rounded up to one of PLOT_WIDTHS and
+    DEVICE_PIXEL_RATIOS, so similar screens share the same cached image.
+
+    Args:
+        args (dict): The request's query arguments.
+
+    Returns:
+        tuple: (width, dpi, image_format), where image_format is None if the
+               client did not ask for a specific format.
+
+    Raises:
+        ValueError: If an argument is not a number or the format is unknown.
+    """
+    def round_up(value, choices):
+        return next((choice for choice in choices if choice >= value), choices[-1])
+
+    width = round_up(float(args.get("width", PLOT_WIDTHS[-1])), PLOT_WIDTHS)
+    dpi = 100 * round_up(float(args.get("dpi", 100)) / 100, DEVICE_PIXEL_RATIOS)
+    image_format = args.get("format")
+    if image_format is not None and image_format not in IMAGE_FORMATS:
+        raise ValueError(f"Unknown image format '{image_format}'. "
+                         f"Choose from: {', '.join(IMAGE_FORMATS)}.")
+    return width, dpi, image_format
+
+
+def create_plot(city_name, width=1600, dpi=100, image_format="png"):
+    """
+    Creates the weather dashboard plot for a city, 4:3 in shape.
+
+    The rendered image is shared between workers and only redrawn when a new
+    sample has been collected for the city. Images for older samples are
+    deleted when a new one is stored.
+
+    Args:
+        city_name (str): The name of the city.
+        width (int): The width the chart is shown at, in CSS pixels.
+        dpi (int): Dots per inch; 100 gives one image pixel per CSS pixel,
+                   200 suits a screen with a device pixel ratio of 2.
+        image_format (str): One of the keys of IMAGE_FORMATS.
+
+    Returns:
+        bytes: The encoded image.
+    """
+    if image_format == "svg":
+        dpi = 100  # Vector images look the same at every resolution.
+    city_prefix = f"plot-{weather_history.city_slug(city_name)}-"
+    image_name = f"{city_prefix}{width}-{dpi}.{image_format}"
+
+    def read_samples():
+        samples = weather_history.tail_history(city_name, LIVE_POINTS)
+        version = samples[-1][0].strftime(weather_history.TIMESTAMP_FORMAT) if samples else "empty"
+        return samples, version
+
+    samples, version = read_samples()
+    image_data = shared_state.read_versioned(image_name, version)
+    if image_data is None:
+        # One lock covers all images of a city.
+        with shared_state.locked(city_prefix.rstrip("-")):
+            # A new sample may have arrived, and another worker may have drawn
+            # it, while we waited. Drawing the older samples now would replace
+            # the newer images, so always draw the newest samples.
+            samples, version = read_samples()
+            image_data = shared_state.read_versioned(image_name, version)
+            if image_data is None:
+                image_data = render_plot(city_name, samples, width, width * 3 // 4, dpi, image_format,
+                                         DEFAULT_COMPRESS_LEVEL)
+                shared_state.write_versioned(image_name, version, image_data)
+                shared_state.remove_old_versions(city_prefix, version)
+    return image_data
+
+
+def render_plot(city_name, samples, width=1600, height=1200, dpi=100, image_format="png",
+                level=DEFAULT_COMPRESS_LEVEL):
+    """
+    Draws the weather dashboard plot.
+
+    Args:
+        city_name (str): The name of the city for the plot title.
+        samples (list): (time, temperature, humidity, wind_speed, pressure) tuples.
+                        Times without a timezone are taken to be local time.
+        width, height (int): The size of the chart in CSS pixels.
+        dpi (int): Dots per inch of the output image.
+        image_format (str): One of the keys of IMAGE_FORMATS.
+        level (int): Compression effort from 0 (fastest) to 9 (smallest).
 
-    # Encode the image data to base64.
-    return base64.b64encode(img_stream.getvalue()).decode('utf-8')
+    Returns:
+        bytes: The encoded image.
+    """
+    timestamps, temperatures, humidity, wind_speed, pressure = \
+        (list(column) for column in zip(*samples)) if samples else ([], [], [], [], [])
+    # Samples are stored in UTC; label the time axis in the server's local time.
+    timestamps = [timestamp.astimezone().replace(tzinfo=None) for timestamp in timestamps]
+
+    # One inch is 100 CSS pixels. Four charts do not fit in a phone-sized
+    # layout, so small charts are laid out at MIN_LAYOUT_WIDTH and drawn at a
+    # lower dpi instead: the image has the same number of pixels and the
+    # browser shrinks it, as it did with the original 16-inch chart.
+    if width < MIN_LAYOUT_WIDTH:
+        dpi = dpi * width / MIN_LAYOUT_WIDTH
+        height = height * MIN_LAYOUT_WIDTH / width
+        width = MIN_LAYOUT_WIDTH
+    figsize = (width / 100, height / 100)
+    # Text and lines were designed for a 16-inch wide chart, so they shrink
+    # with smaller charts (but stay readable).
+    scale = min(1.0, max(0.55, figsize[0] / 16))
+
+    # Pyplot keeps global state, so only one thread in this process draws at a time.
+    with _render_lock:
+        # Use a modern, light seaborn style that fits the glassmorphism theme
+        sns.set_style("whitegrid")
+
+        # Create a figure with four subplots.
+        fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=figsize, dpi=dpi)
+        fig.suptitle(f"Live Weather Data for {city_name}", fontsize=24 * scale, weight='bold', y=0.95,
+                     color='#4a5568')
+
+        # --- Plot 1: Temperature ---
+        ax1.plot(timestamps, temperatures, color='#f56565', marker='o', linestyle='-',
+                 linewidth=2 * scale, markersize=6 * scale)
+        ax1.set_title("Temperature (°C)", fontsize=16 * scale, weight='bold', color='#4a5568')
+        ax1.set_ylabel("Temp (°C)", fontsize=14 * scale, color='#718096')
+        ax1.grid(True, linestyle='--', alpha=0.6)
+        ax1.tick_params(colors='#718096', labelsize=10 * scale)
+
+        # --- Plot 2: Humidity ---
+        ax2.plot(timestamps, humidity, color='#48bb78', marker='o', linestyle='-',
+                 linewidth=2 * scale, markersize=6 * scale)
+        ax2.set_title("Humidity (%)", fontsize=16 * scale, weight='bold', color='#4a5568')
+        ax2.set_ylabel("Humidity (%)", fontsize=14 * scale, color='#718096')
+        ax2.grid(True, linestyle='--', alpha=0.6)
+        ax2.tick_params(colors='#718096', labelsize=10 * scale)
+
+        # --- Plot 3: Wind Speed ---
+        ax3.plot(timestamps, wind_speed, color='#667eea', marker='o', linestyle='-',
+                 linewidth=2 * scale, markersize=6 * scale)
+        ax3.set_title("Wind Speed (m/s)", fontsize=16 * scale, weight='bold', color='#4a5568')
+        ax3.set_ylabel("Wind Speed (m/s)", fontsize=14 * scale, color='#718096')
+        ax3.set_xlabel("Time", fontsize=14 * scale, color='#718096')
+        ax3.grid(True, linestyle='--', alpha=0.6)
+        ax3.tick_params(colors='#718096', labelsize=10 * scale)
+        plt.setp(ax3.get_xticklabels(), rotation=45, ha='right')
+
+        # --- Plot 4: Atmospheric Pressure ---
+        ax4.plot(timestamps, pressure, color='#f6ad55', marker='o', linestyle='-',
+                 linewidth=2 * scale, markersize=6 * scale)
+        ax4.set_title("Atmospheric Pressure (hPa)", fontsize=16 * scale, weight='bold', color='#4a5568')
+        ax4.set_ylabel("Pressure (hPa)", fontsize=14 * scale, color='#718096')
+        ax4.set_xlabel("Time", fontsize=14 * scale, color='#718096')
+        ax4.grid(True, linestyle='--', alpha=0.6)
+        ax4.tick_params(colors='#718096', labelsize=10 * scale)
+        plt.setp(ax4.get_xticklabels(), rotation=45, ha='right')
+
+        # General figure and layout adjustments
+        fig.tight_layout(rect=[0, 0.03, 1, 0.95])
+
+        # Transparent background, so the chart sits on the page's glass panel.
+        for patch in [fig.patch] + [ax.patch for ax in fig.axes]:
+            patch.set_facecolor('none')
+            patch.set_edgecolor('none')
+        # Draw the pixels once here, so encode_figure() only has to encode them.
+        fig.canvas.draw()
+
+        try:
+            return encode_figure(fig, image_format, level)
+        finally:
+            plt.close(fig)  # Close the figure to free up memory.
+
+
+def encode_figure(fig, image_format, level):
+    """
+    Saves a drawn figure as an image in the given format.
+
+    Args:
+        fig (Figure): The Matplotlib figure, already drawn with fig.canvas.draw().
+        image_format (str): One of the keys of IMAGE_FORMATS.
+        level (int): Compression effort from 0 (fastest) to 9 (smallest).
+
+    Returns:
+        bytes: The encoded image. SVG images are gzip-compressed, because
+               SVG shrinks several times and browsers accept it with
+               'Content-Encoding: gzip'.
+    """
+    img_stream = io.BytesIO()
+    if image_format == "svg":
+        # Vector output: the size does not depend on the resolution. Text is
+        # drawn as outlines so it looks the same without the chart's fonts.
+        fig.savefig(img_stream, format='svg')
+        return gzip.compress(img_stream.getvalue(), compresslevel=level)
+
+    # Raster formats are encoded by Pillow from the pixels already drawn.
+    image = Image.frombuffer("RGBA", fig.canvas.get_width_height(), fig.canvas.buffer_rgba(),
+                             "raw", "RGBA", 0, 1)
+    if image_format == "png":
+        image.save(img_stream, format='PNG', compress_level=level)
+    else:
+        # Charts use only a handful of colors, so a small palette loses almost
+        # nothing and makes both formats compress much better.
+        image = image.quantize(colors=PALETTE_COLORS, method=Image.Quantize.FASTOCTREE)
+        if image_format == "png8":
+            image.save(img_stream, format='PNG', compress_level=level)
+        else:
+            # Lossless WebP keeps lines and text sharp; 'method' trades speed for size
+            # (levels above 7 are much slower for little gain).
+            image.convert("RGBA").save(img_stream, format='WEBP', lossless=True,
+                                       quality=level * 100 // 9, method=round(level * 6 / 9))
+    return img_stream.getvalue()
 
 
 # --- Flask Routes ---
@@ -269,24 +676,18 @@ def index():
     """
     Main route to display the weather dashboard.
     """
-    global timestamps, temperatures, humidity, wind_speed, pressure
-
     # Check if a city was submitted via the form
-    if request.method == "POST":
-        city_name = request.form.get("city")
+    # An empty search keeps showing the current city.
+    city_name = (request.form.get("city") or "").strip() if request.method == "POST" else ""
+    if city_name:
         session['city'] = city_name
-        # Clear data on new city search to prevent mixed graphs
-        timestamps.clear()
-        temperatures.clear()
-        humidity.clear()
-        wind_speed.clear()
-        pressure.clear()
     else:
-        city_name = session.get('city', 'Dnipro, Ukraine')
+        city_name = session.get('city') or DEFAULT_CITY
 
-    # Update data with the remembered city name.
-    update_live_data(city_name)
-    current_weather_data = get_weather_data(CURRENT_WEATHER_URL, city_name)
+    # Each city has its own history, so graphs never mix. The data comes from
+    # the shared cache, which the collector keeps up to date.
+    watch_city(city_name)
+    current_weather_data = get_current_weather(city_name)
 
     # Extract data with safe access
     if current_weather_data:
@@ -313,8 +714,8 @@ def index():
 
     forecast_list = get_weather_forecast(city_name)
 
-    # Generate the plot image.
-    plot_image_base64 = create_plot(city_name)
+    # The plot image is loaded separately from /plot/<city>, sized for the viewer's screen.
+    plot_url = url_for('plot', city=city_name)
 
     # The HTML template with the new glassmorphism visual design.
     html_template = """
@@ -464,7 +865,19 @@ def index():
 
             <!-- Graph Section -->
             <div class="w-full glass-chart mt-6">
-                <img src="data:image/png;base64,{{ plot_image }}" alt="Live Weather Graphs" class="graph-image">
+                <img id="graph-image" alt="Live Weather Graphs" class="graph-image w-full">
+                <script>
+                    // Ask for a chart that fits the space it is shown in and the screen's pixel density.
+                    (function () {
+                        // A JavaScript string, not HTML: city names like "L'Aquila" must not be escaped as HTML.
+                        var plotUrl = {{ plot_url|tojson }};
+                        var image = document.getElementById('graph-image');
+                        var width = image.parentElement.clientWidth;
+                        image.src = plotUrl + "?width=" + width +
+                            "&dpi=" + Math.round(100 * (window.devicePixelRatio || 1));
+                    })();
+                </script>
+                <noscript><img src="{{ plot_url }}" alt="Live Weather Graphs" class="graph-image w-full"></noscript>
             </div>
 
             <!-- Forecast Cards -->
@@ -483,7 +896,7 @@ def index():
     </body>
     </html>
     """
-    return render_template_string(html_template, plot_image=plot_image_base64, city_name=city_name,
+    return render_template_string(html_template, plot_url=plot_url, city_name=city_name,
                                   current_temp=current_temp, current_humidity=current_humidity,
                                   current_wind_speed=current_wind_speed,
                                   current_pressure=current_pressure,
@@ -497,8 +910,93 @@ def index():
                                   forecast_list=forecast_list)
 
 
+@app.route("/plot/<city>")
+def plot(city):
+    """
+    Serves the dashboard chart for a city as an image.
+
+    Only cities that are being viewed on the dashboard are drawn.
+
+    Optional query parameters:
+        width: The width the chart is shown at, in CSS pixels.
+        dpi: 100 per device pixel ratio, e.g. 200 for a retina screen.
+        format: svg, webp, png8 or png. By default the smallest format
+                allowed by the browser's Accept and Accept-Encoding headers is used.
+    """
+    if city not in shared_state.active_cities(ACTIVE_CITY_TIMEOUT):
+        abort(404, description="This city is not shown on the dashboard.")
+    try:
+        width, dpi, image_format = read_plot_options(request.args)
+    except ValueError as e:
+        abort(400, description=str(e))
+    # Quality values count: 'Accept-Encoding: gzip;q=0' means "no gzip".
+    gzip_accepted = request.accept_encodings["gzip"] > 0
+    if image_format is None:
+        pixels = (width * dpi // 100) * (width * 3 // 4 * dpi // 100)
+        image_format = choose_image_format(request.headers.get("Accept"), gzip_accepted, pixels)
+
+    image_data = create_plot(city, width, dpi, image_format)
+    response = Response(mimetype=IMAGE_FORMATS[image_format])
+    response.headers["Vary"] = "Accept, Accept-Encoding"
+    if image_format == "svg":
+        # SVG images are stored gzip-compressed; only unpack them for clients that need it.
+        if gzip_accepted:
+            response.headers["Content-Encoding"] = "gzip"
+        else:
+            image_data = gzip.decompress(image_data)
+    response.set_data(image_data)
+    # The page reloads the same URL every refresh: let the browser revalidate
+    # it and get a short "304 Not Modified" when no new sample has arrived.
+    response.headers["Cache-Control"] = "no-cache"
+    response.add_etag()
+    return response.make_conditional(request)
+
+
+@app.route("/export/<city>.<export_format>")
+def export(city, export_format):
+    """
+    Streams the collected history for a city as CSV or NDJSON.
+
+    Optional query parameters:
+        start, end: ISO times limiting the exported range (both inclusive;
+                    an end date without a time includes that whole day).
+        metrics: Comma-separated list of metrics (default: all).
+
+    The output is gzip-compressed on the fly when the client accepts it.
+    """
+    # Quality values count: 'Accept-Encoding: gzip;q=0' means "no gzip".
+    compress = request.accept_encodings["gzip"] > 0
+    try:
+        rows = weather_history.export_history(
+            city, export_format,
+            start=weather_history.parse_time(request.args.get("start")),
+            end=weather_history.parse_time(request.args.get("end"), end_of_day=True),
+            metrics=weather_history.parse_metrics(request.args.get("metrics")),
+            compress=compress
+        )
+        # Start the generator now so an invalid format is reported as a 400.
+        first_chunk = next(rows, b"")
+    except ValueError as e:
+        abort(400, description=str(e))
+
+    def generate():
+        yield first_chunk
+        yield from rows
+
+    mimetypes = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+    response = Response(stream_with_context(generate()), mimetype=mimetypes[export_format])
+    response.headers["Content-Disposition"] = \
+        f"attachment; filename={weather_history.city_slug(city)}.{export_format}"
+    if compress:
+        response.headers["Content-Encoding"] = "gzip"
+    response.headers["Vary"] = "Accept-Encoding"
+    return response
+
+
 # --- Main Entry Point ---
 if __name__ == "__main__":
     print("Starting Flask web server...")
     print("Open your browser and navigate to http://127.0.0.1:5000/")
-    app.run(debug=True, use_reloader=False)
+    # Threaded so a long export does not hold up the dashboard. In production,
+    # run gunicorn with threaded workers (see gunicorn.conf.py) for the same reason.
+    app.run(debug=True, use_reloader=False, threaded=True)
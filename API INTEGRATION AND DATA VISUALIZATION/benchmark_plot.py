@@ -0,0 +1,95 @@
+# --- Chart Image Benchmark (benchmark_plot.py) ---
+# This script renders the dashboard chart for a few typical screens and
+# reports the size and encode time of every image format, so the format
+# preferences in app.py (RASTER_FORMAT_PREFERENCE and friends) can be checked.
+# SVG sizes are after gzip, as sent to the browser. The "svg-text" row shows
+# what SVG would cost with text left to the browser's fonts instead of outlines.
+#
+# Usage:
+#     python benchmark_plot.py [--repeat N] [--level 0-9]
+
+# --- Library Imports ---
+import argparse
+import math
+import time
+from datetime import datetime, timedelta
+
+import matplotlib.pyplot as plt
+
+import app
+
+# Typical viewers: (name, width, dpi) with the width in CSS pixels, rounded up
+# to the sizes app.py renders (PLOT_WIDTHS and DEVICE_PIXEL_RATIOS).
+SCREENS = [
+    ("original 16x12in", 1600, 100),
+    ("desktop", 800, 100),
+    ("desktop retina", 800, 200),
+    ("mobile (dpr 3)", 480, 300),
+]
+
+
+# Time spent in app.encode_figure during the last render (see timed_encode_figure).
+_encode_seconds = 0.0
+
+
+# --- Function Definitions ---
+def timed_encode_figure(fig, image_format, level, encode_figure=app.encode_figure):
+    """
+    Wraps app.encode_figure to measure the encoding step on its own. The
+    figure has already been drawn by app.render_plot, so only encoding is
+    timed (for SVG, encoding means writing out every shape and glyph).
+    """
+    global _encode_seconds
+    started = time.perf_counter()
+    data = encode_figure(fig, image_format, level)
+    _encode_seconds = time.perf_counter() - started
+    return data
+
+
+def make_samples(count=app.LIVE_POINTS):
+    """
+    Builds a realistic-looking series of samples, one every 15 seconds.
+    """
+    start = datetime(2024, 5, 1, 12, 0, 0)
+    return [(start + timedelta(seconds=15 * i),
+             18 + 3 * math.sin(i / 9), 60 + 10 * math.cos(i / 7),
+             4 + math.sin(i / 3), 1012 + 2 * math.sin(i / 11))
+            for i in range(count)]
+
+
+def main():
+    """
+    Runs the benchmark and prints one line per screen and format.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark chart image formats.")
+    parser.add_argument("--repeat", type=int, default=3, help="Renders per measurement (default: 3).")
+    parser.add_argument("--level", type=int, default=app.DEFAULT_COMPRESS_LEVEL,
+                        help=f"Compression level 0-9 (default: {app.DEFAULT_COMPRESS_LEVEL}).")
+    options = parser.parse_args()
+
+    samples = make_samples()
+    app.encode_figure = timed_encode_figure
+    # The original dashboard: full-color PNG, 16x12 inches at 100 dpi, default compression.
+    baseline = len(app.render_plot("Dnipro, Ukraine", samples, 1600, 1200, 100, "png", 6))
+    print(f"Baseline (original full-color PNG): {baseline:,} bytes\n")
+    print(f"{'screen':<18} {'format':<8} {'bytes':>10} {'vs baseline':>12} {'encode ms':>10} {'total ms':>10}")
+    for name, width, dpi in SCREENS:
+        for label in list(app.IMAGE_FORMATS) + ["svg-text"]:
+            image_format = "svg" if label == "svg-text" else label
+            font_type = "none" if label == "svg-text" else "path"
+            encode_times, total_times = [], []
+            for _ in range(options.repeat):
+                started = time.perf_counter()
+                with plt.rc_context({"svg.fonttype": font_type}):
+                    data = app.render_plot("Dnipro, Ukraine", samples, width, width * 3 // 4, dpi,
+                                           image_format, options.level)
+                total_times.append(time.perf_counter() - started)
+                encode_times.append(_encode_seconds)
+            # The fastest run is the least noisy.
+            print(f"{name:<18} {label:<8} {len(data):>10,} {baseline / len(data):>11.1f}x "
+                  f"{min(encode_times) * 1000:>10.1f} {min(total_times) * 1000:>10.1f}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
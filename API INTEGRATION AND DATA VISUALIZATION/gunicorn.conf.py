@@ -0,0 +1,15 @@
+# --- Gunicorn Settings (gunicorn.conf.py) ---
+# Gunicorn reads this file automatically when started from this directory:
+#     gunicorn app:app
+#
+# A streaming export (/export/<city>.csv) can run for minutes. With gunicorn's
+# default "sync" workers it would hold a whole worker process until it
+# finishes, so we use threaded workers: each worker serves several requests
+# at once and a long export only occupies one of its threads.
+
+# Threaded workers.
+worker_class = "gthread"
+# Worker processes; they share data through shared_state.py.
+workers = 2
+# Requests each worker can serve at the same time.
+threads = 8
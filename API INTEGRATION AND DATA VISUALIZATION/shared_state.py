@@ -0,0 +1,286 @@
+# --- Shared State Store (shared_state.py) ---
+# When app.py runs under several worker processes (e.g. gunicorn), each worker
+# has its own memory. This module keeps the state they need to agree on -
+# cached API payloads, rendered images and the list of cities being watched -
+# in small files on the local disk, so every worker sees the same data and
+# only one of them talks to the weather API at a time.
+
+# --- Library Imports ---
+import os
+import json
+import time
+import zlib
+import tempfile
+from contextlib import contextmanager
+
+try:
+    import fcntl  # File locks between processes (Linux/macOS).
+except ImportError:
+    # Without fcntl (e.g. on Windows) we fall back to single-process behaviour:
+    # locks become no-ops and every process acts as its own collector.
+    fcntl = None
+
+# --- Store Configuration ---
+# Directory that holds the shared files. It can be moved with the
+# WEATHER_STATE_DIR environment variable.
+STATE_DIR = os.environ.get(
+    "WEATHER_STATE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "state")
+)
+
+# Locks are spread over a fixed number of lock files, so the number of files
+# does not grow with the number of cities. Two unrelated names may share a
+# lock file; that only means they wait for each other now and then.
+LOCK_SLOTS = 32
+# Locks that may be taken while another lock is held get a file of their own,
+# so they can never share a file with the outer lock (which would deadlock).
+DEDICATED_LOCKS = ("cities.json", "secret_key")
+
+# The lock file held by the elected collector for as long as its process lives.
+_collector_lock_file = None
+
+
+# --- Function Definitions ---
+def state_path(name):
+    """
+    Returns the path of a file in the shared state directory.
+    """
+    os.makedirs(STATE_DIR, exist_ok=True)
+    return os.path.join(STATE_DIR, name)
+
+
+@contextmanager
+def locked(name):
+    """
+    Holds an exclusive lock shared by all processes on this host.
+
+    Only locks named in DEDICATED_LOCKS may be taken while holding another lock.
+
+    Args:
+        name (str): The name of the lock, e.g. 'current-dnipro.json'.
+    """
+    if fcntl is None:
+        yield
+        return
+    if name in DEDICATED_LOCKS:
+        lock_name = f"{name}.lock"
+    else:
+        lock_name = f"lock-{zlib.crc32(name.encode('utf-8')) % LOCK_SLOTS:02d}.lock"
+    with open(state_path(lock_name), "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def read_bytes(name, max_age=None):
+    """
+    Reads a shared file.
+
+    Args:
+        name (str): The name of the file.
+        max_age (float or None): If given, files older than this many seconds
+                                 are treated as missing.
+
+    Returns:
+        bytes or None: The file contents, or None if missing or too old.
+    """
+    path = state_path(name)
+    try:
+        if max_age is not None and time.time() - os.path.getmtime(path) > max_age:
+            return None
+        with open(path, "rb") as state_file:
+            return state_file.read()
+    except OSError:
+        return None
+
+
+def write_bytes(name, data):
+    """
+    Replaces a shared file. The new contents are written to a temporary file
+    first and then moved into place, so readers never see a half-written file.
+    """
+    path = state_path(name)
+    fd, temp_path = tempfile.mkstemp(dir=STATE_DIR, prefix=f".{name}.")
+    try:
+        with os.fdopen(fd, "wb") as temp_file:
+            temp_file.write(data)
+        os.replace(temp_path, path)
+    except OSError:
+        os.unlink(temp_path)
+        raise
+
+
+def read_json(name, max_age=None):
+    """
+    Reads a shared JSON file. Returns None if it is missing, too old or invalid.
+    """
+    data = read_bytes(name, max_age)
+    if data is None:
+        return None
+    try:
+        return json.loads(data)
+    except ValueError:
+        return None
+
+
+def write_json(name, value):
+    """
+    Replaces a shared JSON file.
+    """
+    write_bytes(name, json.dumps(value).encode("utf-8"))
+
+
+def cached_json(name, max_age, fetch):
+    """
+    Returns a shared cached value, calling fetch() only when it is too old.
+
+    The refresh happens under a lock, so when several workers find the value
+    stale at the same moment only one of them calls fetch(); the others wait
+    and then use its result.
+
+    Args:
+        name (str): The name of the cache file.
+        max_age (float): How many seconds a cached value stays fresh.
+        fetch (callable): Returns a new value, or None on failure.
+
+    Returns:
+        The cached or freshly fetched value. If fetch() fails, the last cached
+        value is returned however old it is (or None if there is none).
+    """
+    value = read_json(name, max_age)
+    if value is not None:
+        return value
+    with locked(name):
+        # Another worker may have refreshed the value while we waited.
+        value = read_json(name, max_age)
+        if value is not None:
+            return value
+        value = fetch()
+        if value is not None:
+            write_json(name, value)
+            return value
+    return read_json(name)
+
+
+def read_versioned(name, version):
+    """
+    Reads a shared file only if it was written for the given version.
+
+    Args:
+        name (str): The name of the file.
+        version (str): The version the caller needs, e.g. the time of the newest sample.
+
+    Returns:
+        bytes or None: The stored data, or None if missing or for another version.
+    """
+    data = read_bytes(name)
+    if data is None:
+        return None
+    stored_version, _, payload = data.partition(b"\n")
+    if stored_version.decode("utf-8", "replace") != version:
+        return None
+    return payload
+
+
+def write_versioned(name, version, data):
+    """
+    Replaces a shared file, tagging it with a version (which must not contain a newline).
+    """
+    write_bytes(name, version.encode("utf-8") + b"\n" + data)
+
+
+def remove_old_versions(prefix, version):
+    """
+    Deletes the shared files starting with prefix that were written for
+    another version, e.g. chart images drawn before the newest sample.
+    """
+    for name in os.listdir(STATE_DIR):
+        if name.startswith(prefix) and not name.endswith(".lock"):
+            try:
+                with open(state_path(name), "rb") as state_file:
+                    stored_version = state_file.readline().rstrip(b"\n").decode("utf-8", "replace")
+                if stored_version != version:
+                    os.unlink(state_path(name))
+            except OSError:
+                pass  # Another worker replaced or removed it first.
+
+
+def remove_unused(max_age, is_needed):
+    """
+    Deletes shared files that have not changed for max_age seconds and are
+    no longer needed, e.g. cached data for cities nobody is looking at.
+
+    Args:
+        max_age (float): Files changed more recently than this are kept.
+        is_needed (callable): Called with a file name; returns True to keep it.
+    """
+    now = time.time()
+    for name in os.listdir(STATE_DIR):
+        if name.endswith(".lock") or is_needed(name):
+            continue
+        path = state_path(name)
+        try:
+            if now - os.path.getmtime(path) > max_age:
+                os.unlink(path)
+        except OSError:
+            pass  # Another worker replaced or removed it first.
+
+
+def touch_city(city_name, max_idle):
+    """
+    Marks a city as being watched, so the collector keeps its data up to date.
+
+    Cities not viewed within the last max_idle seconds are dropped at the same
+    time, so the list only holds the cities people are looking at.
+    """
+    with locked("cities.json"):
+        now = time.time()
+        cities = read_json("cities.json") or {}
+        cities = {city: last_seen for city, last_seen in cities.items() if now - last_seen <= max_idle}
+        cities[city_name] = now
+        write_json("cities.json", cities)
+
+
+def forget_city(city_name):
+    """
+    Stops watching a city, e.g. because the API does not know it.
+    """
+    with locked("cities.json"):
+        cities = read_json("cities.json") or {}
+        if cities.pop(city_name, None) is not None:
+            write_json("cities.json", cities)
+
+
+def active_cities(max_idle):
+    """
+    Returns the cities that have been viewed within the last max_idle seconds.
+    """
+    cities = read_json("cities.json") or {}
+    now = time.time()
+    return [city for city, last_seen in cities.items() if now - last_seen <= max_idle]
+
+
+def try_become_collector():
+    """
+    Tries to make this process the single data collector for this host.
+
+    The collector holds an exclusive lock on a file for as long as it runs.
+    If its process exits, the operating system releases the lock and the
+    next worker that calls this function takes over.
+
+    Returns:
+        bool: True if this process is (or has just become) the collector.
+    """
+    global _collector_lock_file
+    if _collector_lock_file is not None or fcntl is None:
+        return True
+    lock_file = open(state_path("collector.lock"), "a")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    _collector_lock_file = lock_file
+    return True
@@ -9,7 +9,9 @@ try:
     import matplotlib.pyplot as plt
     import seaborn as sns
     import time
-    from datetime import datetime
+    import argparse
+    from datetime import datetime, timezone
+    import weather_history
 except ImportError as e:
     # If a required library is missing, print an error and exit.
     print(f"ERROR: A required library could not be imported. Please install it.", file=sys.stderr)
@@ -115,6 +117,10 @@ def create_live_visualization(city_name):
                     wind_speed.pop(0)
                     pressure.pop(0)
 
+                # Keep the full history on disk so it can be exported later.
+                weather_history.record_sample(city_name, datetime.now(timezone.utc), current_temp, current_humidity,
+                                              current_wind_speed, current_pressure)
+
                 # Clear previous plots.
                 ax1.clear()
                 ax2.clear()
@@ -199,11 +205,61 @@ def create_live_visualization(city_name):
         plt.close(fig)
 
 
+def export_history_command(args):
+    """
+    Writes the collected history for a city to a file or standard output.
+
+    Usage:
+        python task.py export CITY [--format csv|ndjson] [--start TIME] [--end TIME]
+                                   [--metrics LIST] [--gzip] [--output FILE]
+
+    Args:
+        args (list): The command-line arguments after 'export'.
+    """
+    parser = argparse.ArgumentParser(prog="task.py export",
+                                     description="Export the collected weather history for a city.")
+    parser.add_argument("city", help="The city to export, e.g. 'Dnipro, Ukraine'.")
+    parser.add_argument("--format", choices=sorted(weather_history.EXPORT_FORMATS), default="csv",
+                        help="Output format (default: csv).")
+    parser.add_argument("--start", help="Only export samples from this ISO time on.")
+    parser.add_argument("--end", help="Only export samples up to and including this ISO time "
+                             "(a date alone includes that whole day).")
+    parser.add_argument("--metrics", help=f"Comma-separated metrics: {', '.join(weather_history.METRICS)}.")
+    parser.add_argument("--gzip", action="store_true", help="Compress the output with gzip.")
+    parser.add_argument("--output", help="File to write to (default: standard output).")
+    options = parser.parse_args(args)
+
+    try:
+        chunks = weather_history.export_history(
+            options.city, options.format,
+            start=weather_history.parse_time(options.start),
+            end=weather_history.parse_time(options.end, end_of_day=True),
+            metrics=weather_history.parse_metrics(options.metrics),
+            compress=options.gzip
+        )
+        output = open(options.output, "wb") if options.output else sys.stdout.buffer
+        try:
+            # Write chunk by chunk so the whole export is never held in memory.
+            for chunk in chunks:
+                output.write(chunk)
+        finally:
+            if options.output:
+                output.close()
+    except ValueError as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
 def main():
     """
     The main function to run the live weather dashboard.
     It now prompts the user for a city name.
+    Run 'python task.py export CITY' to export the collected history instead.
     """
+    if len(sys.argv) > 1 and sys.argv[1] == "export":
+        export_history_command(sys.argv[2:])
+        return
+
     # Prompt the user to enter a city name
     city_name = input("Enter the city name: ")
 
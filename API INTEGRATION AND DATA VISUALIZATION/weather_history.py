@@ -0,0 +1,304 @@
+# --- Weather History Store (weather_history.py) ---
+# This module keeps the full history of collected weather samples on disk, one
+# append-only CSV file per city, and streams it back out as CSV or NDJSON.
+# Both the web app (app.py) and the command-line script (task.py) use it, so
+# the data behind the charts can be exported without loading it into memory.
+
+# --- Library Imports ---
+import os
+import re
+import json
+import zlib
+from datetime import datetime, timezone
+
+# --- Store Configuration ---
+# Directory that holds one history file per city. It can be moved with the
+# WEATHER_HISTORY_DIR environment variable.
+HISTORY_DIR = os.environ.get(
+    "WEATHER_HISTORY_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "history")
+)
+
+# The metrics stored for every sample, in column order.
+METRICS = ("temperature", "humidity", "wind_speed", "pressure")
+
+# Timestamps are stored in UTC as fixed-width ISO strings, so they sort the
+# same way as text as they do as dates and can be compared without parsing.
+# UTC never repeats an hour, unlike local time when daylight saving ends.
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
+TIMESTAMP_WIDTH = 19
+
+# Exported rows are collected into chunks of roughly this many bytes before
+# they are handed to the web server (or compressed), to avoid tiny writes.
+CHUNK_SIZE = 64 * 1024
+
+
+# --- Function Definitions ---
+def city_slug(city_name):
+    """
+    Turns a city name into a safe file name, e.g. 'Dnipro, Ukraine' -> 'dnipro_ukraine'.
+
+    Args:
+        city_name (str): The name of the city.
+
+    Returns:
+        str: A lowercase name made only of letters, digits and underscores.
+    """
+    slug = re.sub(r"[^a-z0-9]+", "_", city_name.strip().lower()).strip("_")
+    return slug or "unknown"
+
+
+def history_path(city_name):
+    """
+    Returns the path of the history file for a city.
+    """
+    return os.path.join(HISTORY_DIR, f"{city_slug(city_name)}.csv")
+
+
+def record_sample(city_name, sample_time, temperature, humidity, wind_speed, pressure):
+    """
+    Appends one weather sample to the city's history file.
+
+    Each sample is written with a single append, so several processes can
+    record into the same file without their lines getting mixed up.
+
+    Args:
+        city_name (str): The name of the city the sample belongs to.
+        sample_time (datetime): When the sample was taken. A time without a
+                                timezone is taken to be local time.
+        temperature, humidity, wind_speed, pressure (float): The measured values.
+    """
+    os.makedirs(HISTORY_DIR, exist_ok=True)
+    line = ",".join([sample_time.astimezone(timezone.utc).strftime(TIMESTAMP_FORMAT),
+                     repr(float(temperature)), repr(float(humidity)),
+                     repr(float(wind_speed)), repr(float(pressure))]) + "\n"
+    with open(history_path(city_name), "a", encoding="utf-8") as history_file:
+        history_file.write(line)
+
+
+def parse_time(value, end_of_day=False):
+    """
+    Converts a user-supplied time (ISO 8601, e.g. '2024-05-01',
+    '2024-05-01T12:30:00' or '2024-05-01T12:30:00+02:00') into the stored
+    timestamp format, which is in UTC.
+
+    Times without an offset are taken to be the server's local time. Give an
+    offset (or 'Z' for UTC) to be exact around daylight saving changes.
+
+    Args:
+        value (str or None): The time given by the user.
+        end_of_day (bool): If True, a date without a time means the last second
+                           of that day, so an 'end' date includes the whole day.
+
+    Returns:
+        str or None: The time as a stored timestamp string, or None if not given.
+
+    Raises:
+        ValueError: If the value is not a valid ISO date or time.
+    """
+    if not value:
+        return None
+    try:
+        # Older Python versions do not understand the 'Z' suffix for UTC.
+        parsed = datetime.fromisoformat(value[:-1] + "+00:00" if value.endswith("Z") else value)
+    except ValueError:
+        raise ValueError(f"Invalid time '{value}'. Use ISO format, e.g. 2024-05-01T12:00:00.")
+    if parsed.tzinfo is None and end_of_day and "T" not in value and " " not in value:
+        parsed = parsed.replace(hour=23, minute=59, second=59)
+    return parsed.astimezone(timezone.utc).strftime(TIMESTAMP_FORMAT)
+
+
+def parse_metrics(value):
+    """
+    Converts a comma-separated list of metric names into a tuple of metrics.
+
+    Args:
+        value (str or None): e.g. 'temperature,pressure'. Empty means all metrics.
+
+    Returns:
+        tuple: The selected metric names, in the order given.
+
+    Raises:
+        ValueError: If an unknown metric name is given.
+    """
+    if not value:
+        return METRICS
+    selected = tuple(name.strip() for name in value.split(",") if name.strip())
+    unknown = [name for name in selected if name not in METRICS]
+    if unknown:
+        raise ValueError(f"Unknown metric(s): {', '.join(unknown)}. "
+                         f"Choose from: {', '.join(METRICS)}.")
+    return selected or METRICS
+
+
+def _seek_to_start(history_file, start):
+    """
+    Moves the file position to the first line whose timestamp is >= start.
+
+    The history file is in time order, so a binary search over byte offsets
+    finds the start of the range without reading everything before it.
+    """
+    history_file.seek(0, os.SEEK_END)
+    low, high = 0, history_file.tell()
+    # Find the last offset whose following full line is still before 'start'.
+    while low < high:
+        middle = (low + high) // 2
+        history_file.seek(middle)
+        if middle:
+            history_file.readline()  # Skip the partial line we landed in.
+        line = history_file.readline()
+        if line and line[:TIMESTAMP_WIDTH] < start:
+            low = middle + 1
+        else:
+            high = middle
+    history_file.seek(low)
+    if low:
+        history_file.readline()
+
+
+def iter_history(city_name, start=None, end=None, metrics=METRICS):
+    """
+    Reads a city's history one sample at a time.
+
+    Args:
+        city_name (str): The name of the city.
+        start (str or None): First timestamp to include (stored format).
+        end (str or None): Last timestamp to include, inclusive (stored format).
+        metrics (tuple): The metrics to return for each sample.
+
+    Yields:
+        tuple: (timestamp string, list of metric values as strings).
+    """
+    path = history_path(city_name)
+    if not os.path.exists(path):
+        return
+    columns = [METRICS.index(name) + 1 for name in metrics]
+    # Open in binary mode so the byte offsets used by the binary search are exact.
+    with open(path, "rb") as history_file:
+        if start:
+            _seek_to_start(history_file, start.encode("ascii"))
+        for raw_line in history_file:
+            fields = raw_line.decode("utf-8").rstrip("\n").split(",")
+            if len(fields) != len(METRICS) + 1:
+                continue  # Skip a partially written line.
+            timestamp = fields[0]
+            if start and timestamp < start:
+                continue
+            if end and timestamp > end:
+                break  # The file is in time order, so nothing later can match.
+            yield timestamp, [fields[column] for column in columns]
+
+
+def tail_history(city_name, count):
+    """
+    Returns the newest samples of a city's history, oldest first.
+
+    Only the end of the file is read, so this stays fast however long the
+    history grows.
+
+    Args:
+        city_name (str): The name of the city.
+        count (int): The maximum number of samples to return.
+
+    Returns:
+        list: (datetime, temperature, humidity, wind_speed, pressure) tuples,
+              with the time in UTC.
+    """
+    path = history_path(city_name)
+    if not os.path.exists(path):
+        return []
+    with open(path, "rb") as history_file:
+        history_file.seek(0, os.SEEK_END)
+        position = history_file.tell()
+        data = b""
+        # Read backwards in blocks until we have enough complete lines.
+        while position > 0 and data.count(b"\n") <= count:
+            step = min(8192, position)
+            position -= step
+            history_file.seek(position)
+            data = history_file.read(step) + data
+
+    samples = []
+    for raw_line in data.splitlines()[-count:]:
+        fields = raw_line.decode("utf-8", "replace").split(",")
+        if len(fields) != len(METRICS) + 1:
+            continue  # Skip a partially written line.
+        try:
+            samples.append((datetime.strptime(fields[0], TIMESTAMP_FORMAT).replace(tzinfo=timezone.utc),
+                            *map(float, fields[1:])))
+        except ValueError:
+            continue
+    return samples
+
+
+def _csv_lines(rows, metrics):
+    """
+    Formats history rows as CSV lines, starting with a header line.
+    """
+    yield "timestamp_utc," + ",".join(metrics) + "\n"
+    for timestamp, values in rows:
+        yield timestamp + "," + ",".join(values) + "\n"
+
+
+def _ndjson_lines(rows, metrics):
+    """
+    Formats history rows as newline-delimited JSON, one object per sample.
+    """
+    for timestamp, values in rows:
+        record = {"timestamp_utc": timestamp}
+        record.update(zip(metrics, map(float, values)))
+        yield json.dumps(record) + "\n"
+
+
+EXPORT_FORMATS = {
+    "csv": _csv_lines,
+    "ndjson": _ndjson_lines,
+}
+
+
+def export_history(city_name, export_format, start=None, end=None, metrics=METRICS, compress=False):
+    """
+    Streams a city's history as CSV or NDJSON, optionally gzip-compressed.
+
+    Rows are read, formatted and compressed as they are needed, so memory use
+    stays the same no matter how much history is exported.
+
+    Args:
+        city_name (str): The name of the city to export.
+        export_format (str): Either 'csv' or 'ndjson'.
+        start (str or None): First timestamp to include (stored format).
+        end (str or None): Last timestamp to include (stored format).
+        metrics (tuple): The metrics to include.
+        compress (bool): If True, the output is a gzip stream.
+
+    Yields:
+        bytes: Chunks of the exported file.
+
+    Raises:
+        ValueError: If the export format is not supported.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format '{export_format}'. "
+                         f"Choose from: {', '.join(EXPORT_FORMATS)}.")
+    lines = EXPORT_FORMATS[export_format](iter_history(city_name, start, end, metrics), metrics)
+    # wbits=31 makes zlib write a gzip header and trailer around the data.
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+
+    buffer = []
+    buffered_size = 0
+    for line in lines:
+        buffer.append(line)
+        buffered_size += len(line)
+        if buffered_size >= CHUNK_SIZE:
+            chunk = "".join(buffer).encode("utf-8")
+            buffer, buffered_size = [], 0
+            if compressor:
+                chunk = compressor.compress(chunk)
+            if chunk:
+                yield chunk
+
+    chunk = "".join(buffer).encode("utf-8")
+    if compressor:
+        chunk = compressor.compress(chunk) + compressor.flush()
+    if chunk:
+        yield chunk